@@ -1,247 +1,696 @@
 import os
+import shutil
 import argparse
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
 import pdfplumber
 import fitz  # PyMuPDF
 
+# Built-in Helvetica, created once and shared by every TextWriter
+# 内置 Helvetica 字体，只创建一次并由所有 TextWriter 共享
+HELV = fitz.Font("helv")
+
+
+# Structure-of-arrays view of a page's words: a list of texts plus one array per attribute
+# (float64 geometry and size, int64 font code)
+# 页面单词的数组结构（SoA）视图：一个文本列表加上每个属性一个数组（float64 几何与字号，int64 字体编码）
+Words = namedtuple("Words", ["text", "x0", "x1", "top", "bottom", "size", "font"])
+
+
+# A page's rebuilt lines: texts plus x0, baseline y and font size arrays
+# 页面重建后的文本行：文本列表加上 x0、基线 y 和字号数组
+PageLines = namedtuple("PageLines", ["text", "x0", "y", "size"])
+
+
+def _make_page_lines(texts, x0s, tops, sizes):
+    """
+    Pack a page's lines into PageLines, computing every baseline in one NumPy expression.
+    'top' is the top of the line bbox; the baseline is nudged down by 0.85 * font size.
+
+    将页面的文本行打包为 PageLines，并用一个 NumPy 表达式计算所有基线。
+    'top' 是行边界框的顶部；基线向下微调 0.85 * 字号。
+    """
+    x0 = np.asarray(x0s, dtype=np.float64)
+    size = np.asarray(sizes, dtype=np.float64)
+    y = np.asarray(tops, dtype=np.float64) + 0.85 * size
+    return PageLines(texts, x0, y, size)
+
+
+def words_to_arrays(words):
+    """
+    Convert pdfplumber word or char dicts into a Words structure of arrays in a single pass.
+    Missing or unparseable sizes are stored as NaN. Font names are stored as integer
+    codes, one per distinct 'fontname' on the page (-1 when missing).
+
+    一次遍历将 pdfplumber 单词或字符字典转换为 Words 数组结构。
+    缺失或无法解析的字号存储为 NaN。字体名存储为整数编码，页面上每个不同的
+    'fontname' 对应一个编码（缺失时为 -1）。
+    """
+    n = len(words)
+    texts = [None] * n
+    x0 = np.empty(n)
+    x1 = np.empty(n)
+    top = np.empty(n)
+    bottom = np.empty(n)
+    size = np.empty(n)
+    font = np.empty(n, dtype=np.int64)
+    font_codes = {}
+
+    for i, w in enumerate(words):
+        texts[i] = w.get("text", "")
+        x0[i] = float(w.get("x0", 0.0))
+        x1[i] = float(w.get("x1", x0[i]))
+        top[i] = float(w.get("top", 0.0))
+        bottom[i] = float(w.get("bottom", top[i] + 10.0))
+        try:
+            size[i] = float(w["size"])
+        except Exception:
+            size[i] = np.nan
+        fontname = w.get("fontname")
+        font[i] = -1 if fontname is None else font_codes.setdefault(fontname, len(font_codes))
+
+    return Words(texts, x0, x1, top, bottom, size, font)
+
+
+def _line_breaks_kernel(tops_sorted, line_tol):
+    """
+    Indices into `tops_sorted` where a new line starts. A word joins the current line
+    while it is within `line_tol` of the line's running-average top.
+
+    返回 `tops_sorted` 中新行开始位置的索引。单词与当前行 top 的移动平均值
+    相差不超过 `line_tol` 时归入当前行。
+    """
+    n = tops_sorted.shape[0]
+    breaks = np.empty(n, dtype=np.int64)
+    n_breaks = 0
+    if n == 0:
+        return breaks[:0]
+
+    current_top = tops_sorted[0]
+    count = 1
+    for i in range(1, n):
+        top = tops_sorted[i]
+        if abs(top - current_top) <= line_tol:
+            # running average stabilizes grouping
+            # 使用移动平均值稳定分组
+            count += 1
+            current_top += (top - current_top) / count
+        else:
+            breaks[n_breaks] = i
+            n_breaks += 1
+            current_top = top
+            count = 1
+
+    return breaks[:n_breaks]
+
+
+# _line_breaks_kernel compiled by numba, or the plain function when numba is missing;
+# set on first use
+# 由 numba 编译的 _line_breaks_kernel（无 numba 时为原函数）；首次使用时设置
+_line_breaks_impl = None
+
+
+def _line_breaks(tops_sorted, line_tol):
+    """
+    Run _line_breaks_kernel. numba is optional and imported only here, on first use, so
+    runs that never group pdfplumber chars (e.g. the PyMuPDF engine) skip its import and
+    compile cost. The compiled kernel is cached on disk across CLI runs.
+
+    运行 _line_breaks_kernel。numba 为可选依赖，仅在此处首次使用时导入，因此从不对
+    pdfplumber 字符分组的运行（例如 PyMuPDF 引擎）无需承担其导入和编译开销。
+    编译后的内核会缓存到磁盘，供后续命令行运行复用。
+    """
+    global _line_breaks_impl
+    if _line_breaks_impl is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _line_breaks_impl = _line_breaks_kernel
+        else:
+            _line_breaks_impl = njit("int64[:](float64[:], float64)", cache=True)(_line_breaks_kernel)
+    return _line_breaks_impl(tops_sorted, line_tol)
+
 
 def group_words_into_lines(words, line_tol=2.0):
     """
     Cluster words into lines using their 'top' coordinate.
+    Returns a list of word-index arrays, one per line, each sorted by x0.
     根据单词的 'top' 坐标将其聚类成行。
+    返回单词索引数组的列表，每行一个，且按 x0 排序。
     """
-    if not words:
+    if not len(words.text):
         return []
 
     # Sort words by top coordinate, then by x coordinate
     # 按 top 坐标排序，然后按 x 坐标排序
-    words = sorted(words, key=lambda w: (float(w.get("top", 0.0)), float(w.get("x0", 0.0))))
+    order = np.lexsort((words.x0, words.top))
 
-    lines = []
-    current = []
-    current_top = None
+    # A new line starts wherever a word drifts beyond the tolerance
+    # 单词偏离超过容差的位置即为新行的开始
+    breaks = _line_breaks(words.top[order], float(line_tol))
 
-    for w in words:
-        top = float(w.get("top", 0.0))
-        if current_top is None:
-            current_top = top
-            current = [w]
-            continue
+    return _split_in_reading_order(words, order, breaks)
 
-        # If the vertical distance is within tolerance, consider it the same line
-        # 如果垂直距离在容差范围内，则认为是同一行
-        if abs(top - current_top) <= line_tol:
-            current.append(w)
-            # running average stabilizes grouping
-            # 使用移动平均值稳定分组
-            current_top = (current_top * (len(current) - 1) + top) / len(current)
-        else:
-            lines.append(current)
-            current = [w]
-            current_top = top
 
-    if current:
-        lines.append(current)
+def group_chars_into_rows(chars, y_tol=3.0):
+    """
+    Cluster chars into text rows before they are joined into words, chaining chars whose
+    sorted 'top' values differ by at most `y_tol` (pdfplumber's default y_tolerance).
+    Returns a list of char-index arrays, one per row, each sorted by x0.
+
+    在将字符合并为单词之前，将其聚类成文本行：排序后 'top' 相差不超过 `y_tol`
+    （pdfplumber 默认的 y_tolerance）的字符链接为同一行。
+    返回字符索引数组的列表，每行一个，且按 x0 排序。
+    """
+    if not len(chars.text):
+        return []
+
+    order = np.lexsort((chars.x0, chars.top))
+    breaks = np.flatnonzero(np.diff(chars.top[order]) > y_tol) + 1
+
+    return _split_in_reading_order(chars, order, breaks)
+
+
+def _split_in_reading_order(words, order, breaks):
+    """
+    Split the top-sorted `order` at `breaks` and re-sort each group by x0.
+    将按 top 排序的 `order` 在 `breaks` 处拆分，并将每组按 x0 重新排序。
+    """
+    # Re-sort by (line, x0) so every line comes out in reading order
+    # 按 (行, x0) 重新排序，使每一行都按阅读顺序排列
+    line_id = np.zeros(len(order), dtype=np.int64)
+    line_id[breaks] = 1
+    line_id = np.cumsum(line_id)
+    order = order[np.lexsort((words.x0[order], line_id))]
+
+    return np.split(order, breaks)
+
+
+def chars_to_words(chars, char_lines, x_tol=3.0):
+    """
+    Join the chars of each line into words. A word ends at a blank char, at an x-gap
+    wider than `x_tol` (pdfplumber's default word tolerance) or where the font name or
+    size changes, like extract_words(extra_attrs=["size", "fontname"]).
+    `char_lines` are x-sorted char-index arrays as returned by group_chars_into_rows.
+    Returns (words, lines): a Words structure and its x-sorted word-index arrays, one per line.
+    Lines made only of blank chars produce no words and are dropped.
+
+    将每行的字符合并为单词。遇到空白字符、x 间隙大于 `x_tol`（pdfplumber 默认的单词容差）
+    或字体名、字号变化时单词结束，与 extract_words(extra_attrs=["size", "fontname"]) 一致。
+    `char_lines` 为 group_chars_into_rows 返回的按 x 排序的字符索引数组。
+    返回 (words, lines)：Words 数组结构及其按 x 排序的单词索引数组（每行一个）。
+    仅由空白字符组成的行不产生单词，会被丢弃。
+    """
+    if not char_lines:
+        return words_to_arrays([]), []
+
+    order = np.concatenate(char_lines)
+    line_start = np.zeros(len(order), dtype=bool)
+    line_start[np.cumsum([0] + [len(g) for g in char_lines[:-1]])] = True
+
+    blank = np.fromiter((not chars.text[i].strip() for i in order), dtype=bool, count=len(order))
+    x0 = chars.x0[order]
+    x1 = chars.x1[order]
+    size = chars.size[order]
+    font = chars.font[order]
+
+    # Word boundaries, computed for all chars of the page at once
+    # 一次性计算整页所有字符的单词边界
+    # Missing sizes are NaN; treat two NaNs as the same size
+    # 缺失的字号为 NaN；两个 NaN 视为相同字号
+    nan_size = np.isnan(size)
+    same_size = (size[1:] == size[:-1]) | (nan_size[1:] & nan_size[:-1])
+
+    new_word = line_start.copy()
+    new_word[1:] |= (
+        (x0[1:] > x1[:-1] + x_tol)
+        | ~same_size
+        | (font[1:] != font[:-1])
+        | blank[:-1]
+    )
+
+    # Drop blank chars; consecutive kept chars with the same word id form a word
+    # 去掉空白字符；具有相同单词编号的连续字符组成一个单词
+    keep = ~blank
+    word_id = np.cumsum(new_word)[keep]
+    line_id = np.cumsum(line_start)[keep]
+    kept = order[keep]
+    if not len(kept):
+        return words_to_arrays([]), []
+
+    starts = np.flatnonzero(np.r_[True, np.diff(word_id) != 0])
+    ends = np.r_[starts[1:], len(kept)]
+    texts = [chars.text[i] for i in kept.tolist()]
+
+    words = Words(
+        ["".join(texts[a:b]) for a, b in zip(starts.tolist(), ends.tolist())],
+        np.minimum.reduceat(chars.x0[kept], starts),
+        np.maximum.reduceat(chars.x1[kept], starts),
+        np.minimum.reduceat(chars.top[kept], starts),
+        np.maximum.reduceat(chars.bottom[kept], starts),
+        chars.size[kept][starts],
+        chars.font[kept][starts],
+    )
+
+    word_line = line_id[starts]
+    lines = np.split(np.arange(len(starts)), np.flatnonzero(np.diff(word_line)) + 1)
+    return words, lines
+
+
+def _compute_space_counts(x0s, x1s, space_unit_pts, min_spaces):
+    """
+    Number of spaces to insert before each word of an x-sorted line (entry 0 is unused).
+    计算按 x 排序的行中每个单词前需要插入的空格数（第 0 项不使用）。
+    """
+    counts = np.zeros(x0s.shape[0], dtype=np.int32)
+
+    # Gap between each word start and the furthest end of all words before it
+    # 每个单词起点与其之前所有单词最远终点之间的间隙
+    gaps = x0s[1:] - np.maximum.accumulate(x1s)[:-1]
+
+    n_spaces = np.maximum(min_spaces, np.rint(gaps / max(0.5, space_unit_pts)).astype(np.int32))
+    # slight negative gaps happen; keep minimal separation only when it looks like a break
+    # 可能会出现轻微的负间隙；仅在看起来像断开时保持最小间隔
+    counts[1:] = np.where(gaps > 0, n_spaces, np.where(gaps > -space_unit_pts * 0.3, 1, 0))
+
+    return counts
 
-    return lines
 
+# Separator strings for the common space counts, built once
+# 常见空格数对应的分隔字符串，只构建一次
+_SPACES = [" " * n for n in range(32)]
 
-def build_line_text(line_words, space_unit_pts=3.0, min_spaces=1):
+
+def build_line_text(words, idx, space_unit_pts=3.0, min_spaces=1):
     """
-    Rebuild a line by inserting spaces based on x-gaps.
+    Rebuild a line from the words at indices `idx` by inserting spaces based on x-gaps.
+    `idx` must be sorted by x0, as returned by group_words_into_lines.
     Returns (text, x0, x1, top, font_size_est).
     
-    通过基于 x 轴间隙插入空格来重建一行文本。
+    根据索引 `idx` 处的单词，通过基于 x 轴间隙插入空格来重建一行文本。
+    `idx` 必须按 x0 排序（与 group_words_into_lines 的返回一致）。
     返回 (文本, x0, x1, top, 估计字体大小)。
     """
-    # Sort words in the line by x-coordinate
-    # 按 x 坐标对行中的单词进行排序
-    line_words = sorted(line_words, key=lambda w: float(w.get("x0", 0.0)))
-
     # representative font size: median of sizes if present, else bbox height
     # 代表性字体大小：如果有尺寸信息则取中位数，否则取边界框高度
-    sizes = []
-    for w in line_words:
-        s = w.get("size", None)
-        if s is not None:
-            try:
-                sizes.append(float(s))
-            except Exception:
-                pass
-
-    if sizes:
-        sizes_sorted = sorted(sizes)
-        font_size = float(sizes_sorted[len(sizes_sorted) // 2])
+    sizes = words.size[idx]
+    sizes = sizes[~np.isnan(sizes)]
+
+    if sizes.size:
+        font_size = float(np.median(sizes))
     else:
         # fallback: median bbox height
         # 后备方案：边界框高度的中位数
-        hs = []
-        for w in line_words:
-            top = float(w.get("top", 0.0))
-            bottom = float(w.get("bottom", top + 10.0))
-            hs.append(max(6.0, bottom - top))
-        hs.sort()
-        font_size = float(hs[len(hs) // 2]) if hs else 10.0
+        hs = np.maximum(6.0, words.bottom[idx] - words.top[idx])
+        font_size = float(np.median(hs)) if hs.size else 10.0
 
     # Median top coordinate for the line
     # 该行的 top 坐标中位数
-    top_med = sorted([float(w.get("top", 0.0)) for w in line_words])[len(line_words) // 2]
-
-    first_x0 = float(line_words[0].get("x0", 0.0))
-    # Initialize last_x1 and prev_x1
-    # 初始化 last_x1 和 prev_x1
-    last_x1 = float(line_words[0].get("x1", line_words[0].get("x0", 0.0)))
-    prev_x1 = float(line_words[0].get("x1", line_words[0].get("x0", 0.0)))
-
-    parts = [line_words[0].get("text", "")]
-
-    for w in line_words[1:]:
-        text = w.get("text", "")
-        x0 = float(w.get("x0", 0.0))
-        x1 = float(w.get("x1", x0))
-
-        # Calculate gap between previous word end and current word start
-        # 计算前一个单词结束和当前单词开始之间的间隙
-        gap = x0 - prev_x1
-
-        if gap > 0:
-            # Calculate number of spaces to insert
-            # 计算要插入的空格数
-            n_spaces = int(round(gap / max(0.5, space_unit_pts)))
-            n_spaces = max(min_spaces, n_spaces)
-            parts.append(" " * n_spaces)
-        else:
-            # slight negative gaps happen; keep minimal separation only when it looks like a break
-            # 可能会出现轻微的负间隙；仅在看起来像断开时保持最小间隔
-            parts.append(" " if gap > -space_unit_pts * 0.3 else "")
+    top_med = float(np.median(words.top[idx]))
 
-        parts.append(text)
-        prev_x1 = max(prev_x1, x1)
-        last_x1 = max(last_x1, x1)
+    x0s = words.x0[idx]
+    x1s = words.x1[idx]
+
+    first_x0 = float(x0s[0])
+    last_x1 = float(x1s.max())
+
+    # Compute all inter-word space counts at once
+    # 一次性计算所有单词间的空格数
+    counts = _compute_space_counts(x0s, x1s, float(space_unit_pts), int(min_spaces))
+
+    # Interleave word texts and separators by slice assignment into a preallocated list
+    # 通过切片赋值将单词文本与分隔符交错写入预分配的列表
+    texts = words.text
+    parts = [None] * (2 * len(idx) - 1)
+    parts[0::2] = [texts[i] for i in idx.tolist()]
+    parts[1::2] = [
+        _SPACES[n] if n < len(_SPACES) else " " * n for n in counts[1:].tolist()
+    ]
 
     return "".join(parts), first_x0, last_x1, top_med, font_size
 
 
-def extract_lines_with_positions(pdf_path, line_tol=2.0, space_unit_pts=3.0, min_spaces=1):
+def _extract_page_lines(page, line_tol, space_unit_pts, min_spaces):
+    """
+    Returns the PageLines of a single pdfplumber page.
+    返回单个 pdfplumber 页面的 PageLines。
+    """
+    # Join chars into words row by row, then group the words into lines.
+    # Lines are clustered per word, not per char, so the running-average
+    # line top is not weighted by character count.
+    # 逐行将字符合并为单词，再将单词分组成行。
+    # 按单词而非字符聚类成行，使行 top 的移动平均值不受字符数加权。
+    chars = words_to_arrays(page.chars)
+    words, _ = chars_to_words(chars, group_chars_into_rows(chars))
+    lines = group_words_into_lines(words, line_tol=line_tol)
+
+    # chars_to_words drops blank chars, so every word and line already has
+    # visible text and none needs to be rebuilt only to be discarded
+    # chars_to_words 已去掉空白字符，因此每个单词和每一行都含有可见文本，无需重建后再丢弃
+    texts, x0s, tops, sizes = [], [], [], []
+    for idx in lines:
+        line_text, x0, x1, top, font_size = build_line_text(
+            words, idx, space_unit_pts=space_unit_pts, min_spaces=min_spaces
+        )
+        texts.append(line_text)
+        x0s.append(x0)
+        tops.append(top)
+        sizes.append(font_size)
+    return _make_page_lines(texts, x0s, tops, sizes)
+
+
+def _extract_page_range(pdf_path, page_numbers, line_tol, space_unit_pts, min_spaces):
+    """
+    Extract lines for a list of 1-based page numbers (None = all pages).
+    Runs in a worker process, so it takes only picklable arguments.
+
+    提取一组页码（从 1 开始，None 表示全部页面）的文本行。
+    在工作进程中运行，因此只接受可序列化的参数。
+    """
+    with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+        return [_extract_page_lines(page, line_tol, space_unit_pts, min_spaces) for page in pdf.pages]
+
+
+# Page chunks per worker process for parallel pdfplumber extraction
+# 并行 pdfplumber 提取时每个工作进程分配的页面块数
+_CHUNKS_PER_WORKER = 4
+
+
+def _page_indices(pages, n_pages):
+    """
+    Sorted, de-duplicated 0-based page indices to process (None = all pages).
+    Raises ValueError for an empty selection or indices outside [0, n_pages).
+    返回需要处理的、已排序且去重的页面索引（从 0 开始，None 表示全部页面）。
+    页面选择为空或索引超出 [0, n_pages) 范围时抛出 ValueError。
+    """
+    if pages is None:
+        return list(range(n_pages))
+    indices = sorted(set(pages))
+    if not indices:
+        raise ValueError("Page selection is empty / 页面选择为空")
+    bad = [i for i in indices if not 0 <= i < n_pages]
+    if bad:
+        raise ValueError(
+            f"Page indices out of range for {n_pages} pages / 页面索引超出范围（共 {n_pages} 页）: {bad}"
+        )
+    return indices
+
+
+def iter_lines_with_positions(pdf, line_tol=2.0, space_unit_pts=3.0, min_spaces=1, workers=None,
+                              pages=None):
+    """
+    Yields PageLines(text, x0, y, size) page by page; see extract_lines_with_positions.
+    In-process pages are released as soon as their lines are yielded. With several
+    workers, at most `workers` page chunks are in flight, so finished results do not
+    pile up ahead of the consumer.
+
+    逐页生成 PageLines(text, x0, y, size)；参见 extract_lines_with_positions。
+    当前进程中的页面在生成其文本行后立即释放。多进程时最多同时处理 `workers` 个页面块，
+    因此已完成的结果不会在调用方消费之前堆积。
+    """
+    if isinstance(pdf, pdfplumber.PDF):
+        for i in _page_indices(pages, len(pdf.pages)):
+            page = pdf.pages[i]
+            yield _extract_page_lines(page, line_tol, space_unit_pts, min_spaces)
+            page.close()
+        return
+
+    pdf_path = pdf
+    with pdfplumber.open(pdf_path) as pdf:
+        n_pages = len(pdf.pages)
+
+    # pdfplumber page numbers are 1-based
+    # pdfplumber 的页码从 1 开始
+    page_numbers = [i + 1 for i in _page_indices(pages, n_pages)]
+    if not page_numbers:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(page_numbers))
+    if workers <= 1:
+        with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+            yield from iter_lines_with_positions(
+                pdf, line_tol=line_tol, space_unit_pts=space_unit_pts, min_spaces=min_spaces
+            )
+        return
+
+    # Several chunks per worker, so only a bounded slice of the document is held at once
+    # 每个进程分配多个页面块，使任意时刻只保留文档的有限部分
+    n_chunks = min(len(page_numbers), workers * _CHUNKS_PER_WORKER)
+    chunks = iter([c.tolist() for c in np.array_split(np.array(page_numbers), n_chunks)])
+
+    def submit(chunk):
+        return ex.submit(_extract_page_range, pdf_path, chunk, line_tol, space_unit_pts, min_spaces)
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = deque(submit(chunk) for chunk in islice(chunks, workers))
+        # Yield in submission order to keep pages ordered; refill the pool before yielding
+        # 按提交顺序生成结果以保持页面顺序；在生成之前先补充进程池任务
+        while pending:
+            result = pending.popleft().result()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(submit(chunk))
+            yield from result
+
+
+def extract_lines_with_positions(pdf, line_tol=2.0, space_unit_pts=3.0, min_spaces=1, workers=None,
+                                 pages=None):
     """
-    Returns list per page: [(line_text, x0, top, font_size), ...]
+    Returns list per page: PageLines(text, x0, y, size)
     Coordinates are in PDF points with origin at top-left (like pdfplumber/PyMuPDF).
+    `pdf` is either a path or an already-open pdfplumber.PDF. An open PDF is reused
+    in-process; a path is split into contiguous page chunks parsed in parallel by
+    `workers` processes (default: one per CPU core).
+    `pages` optionally restricts extraction to these 0-based page indices; the other
+    pages are never parsed.
     
-    返回每页的列表：[(line_text, x0, top, font_size), ...]
+    返回每页的列表：PageLines(text, x0, y, size)
     坐标采用 PDF 点数，原点位于左上角（类似于 pdfplumber/PyMuPDF）。
+    `pdf` 可以是文件路径或已打开的 pdfplumber.PDF。已打开的 PDF 在当前进程中复用；
+    文件路径则被划分为连续的页面块，由 `workers` 个进程并行解析（默认：每个 CPU 核心一个）。
+    `pages` 可选，仅提取这些页面（索引从 0 开始）；其余页面不会被解析。
     """
-    pages_lines = []
+    return list(iter_lines_with_positions(
+        pdf, line_tol=line_tol, space_unit_pts=space_unit_pts, min_spaces=min_spaces,
+        workers=workers, pages=pages
+    ))
+
+
+def extract_page_lines_fitz(page):
+    """
+    Returns the PageLines of a single fitz.Page, using PyMuPDF's own line grouping.
+    Each line is placed at its first span's origin, which is already on the baseline.
+
+    使用 PyMuPDF 自带的行分组，返回单个 fitz.Page 的 PageLines。
+    每行放置在其第一个 span 的 origin 处，该点已位于基线上。
+    """
+    d = page.get_text("dict")
+
+    texts, xs, ys, sizes = [], [], [], []
+    for block in d["blocks"]:
+        # Image blocks have no "lines"
+        # 图像块没有 "lines"
+        for line in block.get("lines", ()):
+            spans = line["spans"]
+            line_text = "".join(span["text"] for span in spans)
+            if not line_text.strip():
+                continue
+            x, y = spans[0]["origin"]
+            texts.append(line_text)
+            xs.append(x)
+            ys.append(y)
+            sizes.append(np.median([span["size"] for span in spans]))
+    return PageLines(
+        texts,
+        np.asarray(xs, dtype=np.float64),
+        np.asarray(ys, dtype=np.float64),
+        np.asarray(sizes, dtype=np.float64),
+    )
+
+
+def extract_lines_fitz(doc, pages=None):
+    """
+    Returns list per page: PageLines(text, x0, y, size) using PyMuPDF's own line grouping.
+    Works on an already-open fitz.Document, so the PDF is parsed only once.
+    `pages` optionally restricts extraction to these 0-based page indices.
+
+    使用 PyMuPDF 自带的行分组，返回每页的列表：PageLines(text, x0, y, size)
+    直接作用于已打开的 fitz.Document，因此 PDF 只需解析一次。
+    `pages` 可选，仅提取这些页面（索引从 0 开始）。
+    """
+    return [extract_page_lines_fitz(doc[i]) for i in _page_indices(pages, len(doc))]
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            # Extract words with extra attributes
-            # 提取带有额外属性的单词
-            words = page.extract_words(
-                keep_blank_chars=False,
-                use_text_flow=False,
-                extra_attrs=["size", "fontname"]
-            )
 
-            # Group words into lines
-            # 将单词分组成行
-            lines = group_words_into_lines(words, line_tol=line_tol)
+def iter_page_lines(doc, input_pdf, page_indices, engine="pymupdf", line_tol=2.0, space_unit_pts=3.0,
+                    min_spaces=1, workers=None):
+    """
+    Yields the PageLines of each page in `page_indices`, one page at a time, so callers
+    can draw a page and release its lines before the next one is extracted.
+    The PyMuPDF engine reads the already-open `doc`; pdfplumber parses `input_pdf`.
+
+    逐页生成 `page_indices` 中每一页的 PageLines，调用方可在提取下一页之前
+    绘制当前页并释放其文本行。PyMuPDF 引擎读取已打开的 `doc`；pdfplumber 解析 `input_pdf`。
+    """
+    if engine == "pymupdf":
+        for i in page_indices:
+            yield extract_page_lines_fitz(doc[i])
+    elif engine == "pdfplumber":
+        yield from iter_lines_with_positions(
+            input_pdf, line_tol=line_tol, space_unit_pts=space_unit_pts, min_spaces=min_spaces,
+            workers=workers, pages=page_indices
+        )
+    else:
+        raise ValueError(f"Unknown engine / 未知引擎: {engine}")
+
 
-            out = []
-            for lw in lines:
-                line_text, x0, x1, top, font_size = build_line_text(
-                    lw, space_unit_pts=space_unit_pts, min_spaces=min_spaces
-                )
-                if line_text.strip():
-                    out.append((line_text, x0, top, font_size))
-            pages_lines.append(out)
+def _pair_page_lines(page_indices, lines_iter):
+    """
+    Pair each page index with its extracted PageLines.
+    Raises RuntimeError if the extractor yields a different number of pages.
 
-    return pages_lines
+    将每个页面索引与其提取出的 PageLines 配对。
+    提取器生成的页数不一致时抛出 RuntimeError。
+    """
+    for i in page_indices:
+        page_lines = next(lines_iter, None)
+        if page_lines is None:
+            raise RuntimeError(f"No lines extracted for page {i} / 未提取到第 {i} 页的文本行")
+        yield i, page_lines
+    if next(lines_iter, None) is not None:
+        raise RuntimeError("Extractor returned extra pages / 提取器返回了多余的页面")
 
 
-def make_side_by_side(input_pdf, output_pdf, line_tol=2.0, space_unit_pts=3.0, min_spaces=1):
+def make_side_by_side(input_pdf, output_pdf, line_tol=2.0, space_unit_pts=3.0, min_spaces=1,
+                      engine="pymupdf", workers=None, pages=None):
     """
     Output pages are double-width:
       left: original page
       right: rebuilt text drawn at approx original coordinates (x offset by page width)
+    `pages` optionally limits the output to these 0-based page indices.
       
     输出页面宽度加倍：
       左侧：原始页面
       右侧：在近似原始坐标处绘制的重建文本（x 坐标偏移页面宽度）
+    `pages` 可选，仅输出这些页面（索引从 0 开始）。
     """
-    src = fitz.open(input_pdf)
-    out = fitz.open()
-
-    # Extract text lines and positions
-    # 提取文本行和位置
-    lines_per_page = extract_lines_with_positions(
-        input_pdf, line_tol=line_tol, space_unit_pts=space_unit_pts, min_spaces=min_spaces
-    )
-
-    for i, src_page in enumerate(src):
-        rect = src_page.rect
-        w, h = rect.width, rect.height
-
-        # Create new page with double width
-        # 创建双倍宽度的新页面
-        new_page = out.new_page(width=2 * w, height=h)
-
-        # Left: embed original page as a vector “form”
-        # 左侧：将原始页面作为矢量“表单”嵌入
-        new_page.show_pdf_page(fitz.Rect(0, 0, w, h), src, i)
-
-        # Right: draw rebuilt text
-        # 右侧：绘制重建的文本
-        x_off = w
-        page_lines = lines_per_page[i] if i < len(lines_per_page) else []
-
-        for (txt, x0, top, font_size) in page_lines:
-            # y: pdfplumber 'top' is top of bbox; nudge toward baseline
-            # y: pdfplumber 的 'top' 是边界框的顶部；向基线微调
-            y = float(top) + float(font_size) * 0.85
-
-            new_page.insert_text(
-                fitz.Point(x_off + float(x0), float(y)),
-                txt,
-                fontsize=float(font_size),
-                fontname="helv",     # built-in Helvetica / 内置 Helvetica 字体
-                color=(0, 0, 0),     # black / 黑色
-                overlay=True
+    with fitz.open(input_pdf) as src:
+        # Validate the selection before creating the output document
+        # 在创建输出文档之前校验页面选择
+        page_indices = _page_indices(pages, len(src))
+        with fitz.open() as out:
+            lines_iter = iter_page_lines(
+                src, input_pdf, page_indices, engine=engine, line_tol=line_tol,
+                space_unit_pts=space_unit_pts, min_spaces=min_spaces, workers=workers
             )
 
-    out.save(output_pdf)
-    out.close()
-    src.close()
+            for i, page_lines in _pair_page_lines(page_indices, lines_iter):
+                src_page = src[i]
+                rect = src_page.rect
+                w, h = rect.width, rect.height
+
+                # Create new page with double width
+                # 创建双倍宽度的新页面
+                new_page = out.new_page(width=2 * w, height=h)
+
+                # Left: embed original page as a vector “form”
+                # 左侧：将原始页面作为矢量“表单”嵌入
+                new_page.show_pdf_page(fitz.Rect(0, 0, w, h), src, i)
+
+                # Right: draw rebuilt text
+                # 右侧：绘制重建的文本
+                x_off = w
+
+                # Accumulate all lines and emit them in one text block
+                # 累积所有行并一次性写入一个文本块
+                tw = fitz.TextWriter(new_page.rect, color=(0, 0, 0))   # black / 黑色
+                for txt, x0, y, font_size in zip(
+                    page_lines.text, page_lines.x0.tolist(), page_lines.y.tolist(), page_lines.size.tolist()
+                ):
+                    tw.append((x_off + x0, y), txt, font=HELV, fontsize=font_size)
+                tw.write_text(new_page)
+
+            # Drop unused objects, merge duplicates and compress streams
+            # 删除未使用的对象、合并重复对象并压缩流
+            out.save(output_pdf, garbage=4, deflate=True, deflate_images=True, deflate_fonts=True)
     print(f"Wrote / 已写入: {output_pdf}")
 
 
-def make_overlay_white(input_pdf, output_pdf, line_tol=2.0, space_unit_pts=3.0, min_spaces=1):
+def make_overlay_white(input_pdf, output_pdf, line_tol=2.0, space_unit_pts=3.0, min_spaces=1,
+                       engine="pymupdf", workers=None, pages=None):
     """
     Output is the original PDF with extracted text overlaid in white.
     This often “reveals” text on top of black redaction bars without detecting them.
+    `pages` optionally limits the output to these 0-based page indices.
     
     输出为原始 PDF，提取的文本以白色覆盖在上方。
     这通常可以在不检测黑色涂黑条的情况下“显示”其上方的文本。
+    `pages` 可选，仅输出这些页面（索引从 0 开始）。
     """
-    doc = fitz.open(input_pdf)
-
-    lines_per_page = extract_lines_with_positions(
-        input_pdf, line_tol=line_tol, space_unit_pts=space_unit_pts, min_spaces=min_spaces
-    )
-
-    for i, page in enumerate(doc):
-        page_lines = lines_per_page[i] if i < len(lines_per_page) else []
-        for (txt, x0, top, font_size) in page_lines:
-            y = float(top) + float(font_size) * 0.85
-            page.insert_text(
-                fitz.Point(float(x0), float(y)),
-                txt,
-                fontsize=float(font_size),
-                fontname="helv",
-                color=(1, 1, 1),   # white / 白色
-                overlay=True
+    if os.path.abspath(input_pdf) == os.path.abspath(output_pdf):
+        raise ValueError(f"Output must differ from input / 输出路径不能与输入相同: {output_pdf}")
+
+    # Open the input and validate the selection before touching the output path,
+    # so a bad input is reported under its own name
+    # 在修改输出路径之前打开输入文件并校验页面选择，使错误信息指向输入文件本身
+    with fitz.open(input_pdf) as src:
+        page_indices = _page_indices(pages, len(src))
+
+    # Build the result next to the output and move it into place only once it is complete,
+    # so a failure never leaves a partial file (or a plain copy of the input) at output_pdf
+    # 在输出文件旁生成结果，完成后再移动到目标位置，
+    # 这样出错时 output_pdf 处不会残留不完整的文件（或输入文件的原样副本）
+    tmp_pdf = f"{output_pdf}.{os.getpid()}.tmp"
+    try:
+        if pages is None:
+            # Work on a copy of the input so it can be saved incrementally
+            # 在输入文件的副本上操作，以便增量保存
+            shutil.copyfile(input_pdf, tmp_pdf)
+            doc = fitz.open(tmp_pdf)
+        else:
+            # A page subset is rewritten in full, so read the input directly
+            # 页面子集需要完整重写，因此直接读取输入文件
+            doc = fitz.open(input_pdf)
+
+        data = None
+        with doc:
+            lines_iter = iter_page_lines(
+                doc, input_pdf, page_indices, engine=engine, line_tol=line_tol,
+                space_unit_pts=space_unit_pts, min_spaces=min_spaces, workers=workers
             )
 
-    doc.save(output_pdf)
-    doc.close()
+            for i, page_lines in _pair_page_lines(page_indices, lines_iter):
+                page = doc[i]
+                tw = fitz.TextWriter(page.rect, color=(1, 1, 1))   # white / 白色
+                for txt, x0, y, font_size in zip(
+                    page_lines.text, page_lines.x0.tolist(), page_lines.y.tolist(), page_lines.size.tolist()
+                ):
+                    tw.append((x0, y), txt, font=HELV, fontsize=font_size)
+                tw.write_text(page)
+
+            if pages is not None:
+                # Dropped pages must not linger in the file: rewrite and compact it
+                # 被丢弃的页面不应残留在文件中：重写并压缩文件
+                doc.select(page_indices)
+                doc.save(tmp_pdf, garbage=4, deflate=True)
+            elif doc.can_save_incrementally():
+                # Append only the new (compressed) text objects; unchanged pages are not re-serialized
+                # 仅追加新的（已压缩）文本对象；未修改的页面不会被重新序列化
+                doc.save(tmp_pdf, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP, deflate=True)
+            else:
+                # Repaired files cannot be appended to; rewrite the whole document instead
+                # 修复过的文件无法增量追加；改为重写整个文档
+                data = doc.tobytes(garbage=4, deflate=True)
+
+        if data is not None:
+            with open(tmp_pdf, "wb") as f:
+                f.write(data)
+        os.replace(tmp_pdf, output_pdf)
+    except BaseException:
+        if os.path.exists(tmp_pdf):
+            os.remove(tmp_pdf)
+        raise
     print(f"Wrote / 已写入: {output_pdf}")
 
 
@@ -251,12 +700,21 @@ def main():
     ap.add_argument("-o", "--output", default=None, help="Output PDF path / 输出 PDF 文件路径")
     ap.add_argument("--mode", choices=["side_by_side", "overlay_white"], default="side_by_side", 
                     help="Output mode: side_by_side or overlay_white / 输出模式：并排显示或白字覆盖")
+    ap.add_argument("--engine", choices=["pymupdf", "pdfplumber"], default="pymupdf",
+                    help="Text extraction engine. pdfplumber rebuilds spacing from word gaps (slower) / "
+                         "文本提取引擎。pdfplumber 根据单词间隙重建空格（较慢）")
     ap.add_argument("--line-tol", type=float, default=2.0, 
-                    help="Line grouping tolerance (pts). Try 1.5–4.0 / 行分组容差 (pts)。尝试 1.5–4.0")
+                    help="Line grouping tolerance (pts), --engine pdfplumber only. Try 1.5–4.0 / "
+                         "行分组容差 (pts)，仅适用于 --engine pdfplumber。尝试 1.5–4.0")
     ap.add_argument("--space-unit", type=float, default=3.0, 
-                    help="Pts per inserted space (bigger => fewer spaces) / 每个插入空格的 pts (越大 => 空格越少)")
+                    help="Pts per inserted space (bigger => fewer spaces), --engine pdfplumber only / "
+                         "每个插入空格的 pts (越大 => 空格越少)，仅适用于 --engine pdfplumber")
     ap.add_argument("--min-spaces", type=int, default=1, 
-                    help="Minimum spaces between words when gap exists / 单词间存在间隙时的最小空格数")
+                    help="Minimum spaces between words when gap exists, --engine pdfplumber only / "
+                         "单词间存在间隙时的最小空格数，仅适用于 --engine pdfplumber")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Processes for pdfplumber extraction (default: CPU count) / "
+                         "pdfplumber 提取使用的进程数（默认：CPU 核心数）")
     args = ap.parse_args()
 
     if not os.path.exists(args.input_pdf):
@@ -270,12 +728,14 @@ def main():
     if args.mode == "side_by_side":
         make_side_by_side(
             args.input_pdf, args.output,
-            line_tol=args.line_tol, space_unit_pts=args.space_unit, min_spaces=args.min_spaces
+            line_tol=args.line_tol, space_unit_pts=args.space_unit, min_spaces=args.min_spaces,
+            engine=args.engine, workers=args.workers
         )
     else:
         make_overlay_white(
             args.input_pdf, args.output,
-            line_tol=args.line_tol, space_unit_pts=args.space_unit, min_spaces=args.min_spaces
+            line_tol=args.line_tol, space_unit_pts=args.space_unit, min_spaces=args.min_spaces,
+            engine=args.engine, workers=args.workers
         )
 
 